@@ -1,9 +1,25 @@
-import pickle
 import pandas as pd
 import re
 import json
+import orjson
 import os
 import scraping as sc
+from collections import deque
+from itertools import islice
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+_RE_BRACKETED = re.compile(r" \[[^\]]+\]|\([^\)]+\]|\([^\)]+\)")
+_RE_BRACKETED2 = re.compile(r"\[[^\)]+\]|\([^\)]+\)")
+_RE_WS = re.compile(r"\n|  ")
+
+# Links to the dictionary and to the notes are not references to other articles
+_EXCLUDED_REFS = ("/dizionario", "#nota_")
+
+# Sources with fewer articles are elaborated serially; larger ones are sent to
+# the workers in batches, with a bounded number of batches in flight
+_PARALLEL_MIN_ARTICLES = 512
+_BATCH_SIZE = 64
+_MAX_PENDING_BATCHES = 2 * (os.cpu_count() or 1)
 
 
 def dataset_loop(
@@ -42,30 +58,35 @@ def dataset_loop(
         else:
             law_sources = sc.source_scraper()
 
-        df = pd.DataFrame()
-
-        for source in law_sources:
-            try:
-                if df_load:
-                    df_json = pd.read_json(os.path.join(path, "dataset", f"{source}.json"))
-                    print(f"{source} loaded: length {len(df_json)}")
-                    df = pd.concat([df, df_json], ignore_index=True)
-                else:
-                    df_json = dataset_creation(
-                        source, scraping, save_scraping, save_dataset, ref_all
-                    )
-                    print(f"{source} stored: length {len(df_json)}")
-                    df = pd.concat([df, df_json], ignore_index=True)
-            except Exception as e:
-                print(f"Error with {source}: {e}")
-                with open(os.path.join(path, "errors.txt"), "a") as f:
-                    f.write(source + "\n")
-                continue
+        frames = []
+
+        # A single worker pool shared by all sources; workers start on first use
+        with ProcessPoolExecutor() as executor:
+            for source in law_sources:
+                try:
+                    if df_load:
+                        df_json = load_json(os.path.join(path, "dataset", f"{source}.json"))
+                        print(f"{source} loaded: length {len(df_json)}")
+                        frames.append(df_json)
+                    else:
+                        df_json = dataset_creation(
+                            source, scraping, save_scraping, save_dataset, ref_all, executor=executor
+                        )
+                        print(f"{source} stored: length {len(df_json)}")
+                        frames.append(df_json)
+                except Exception as e:
+                    print(f"Error with {source}: {e}")
+                    with open(os.path.join(path, "errors.txt"), "a") as f:
+                        f.write(source + "\n")
+                    continue
+
+        # Concatenate once at the end instead of growing the frame per source
+        df = pd.concat(frames, ignore_index=True, copy=False) if frames else pd.DataFrame()
 
         if save:
-            df.to_json(os.path.join(path, "dataset/all.json"), orient="records")
+            save_json(df, os.path.join(path, "dataset/all.json"))
     else:
-        df = pd.read_json(os.path.join(path, "dataset/all.json"))
+        df = load_json(os.path.join(path, "dataset/all.json"))
 
     return df
 
@@ -78,6 +99,7 @@ def dataset_creation(
     ref_all: bool = True,
     path: str = "data/dataset/",
     data: str = "data/soups/",
+    executor: Executor = None,
 ) -> pd.DataFrame:
     """
     Creates a dataset for a given law source.
@@ -90,18 +112,19 @@ def dataset_creation(
     ref_all (bool): Whether to include all references or not.
     path (str): Path to save the dataset.
     data (str): Path to load the data.
+    executor (Executor): Worker pool to elaborate the articles with, if any.
 
     Returns:
     pd.DataFrame: The created dataset.
     """
-    soups, links = load_data(law_source, scraping, save_scraping, path=data)
-    df = dataset_elaboration(law_source, soups, links, save_dataset, ref_all, path)
+    records, links = load_data(law_source, scraping, save_scraping, path=data)
+    df = dataset_elaboration(law_source, records, links, save_dataset, ref_all, path, executor)
     return df
 
 
 def load_data(law_source: str, scraping: bool, save_scraping: bool, path: str = "data/soups/") -> tuple:
     """
-    Loads data from pickle files or scrapes if necessary.
+    Loads data from the compressed scraping cache or scrapes if necessary.
 
     Parameters:
     law_source (str): The source of the law data.
@@ -110,101 +133,194 @@ def load_data(law_source: str, scraping: bool, save_scraping: bool, path: str =
     path (str): Path to the data directory.
 
     Returns:
-    tuple: Loaded soups and links.
+    tuple: Loaded article records and links.
     """
     if scraping:
-        soups, links = sc.brocardi_scraper(law_source, save_scraping, path)
+        records, links = sc.brocardi_scraper(law_source, save_scraping, path)
     else:
-        with open(os.path.join(path, f"{law_source}.pkl"), "rb") as f:
-            soups, links = zip(*pickle.load(f))
+        records, links = sc.load_scraped_data(law_source, path)
 
     print("Data loaded correctly")
-    return soups, links
+    return records, links
 
 
 def dataset_elaboration(
-    law_source: str, soups: list, links: list, save_dataset: bool, ref_all: bool = True, path: str = "data/"
+    law_source: str,
+    records: list,
+    links: list,
+    save_dataset: bool,
+    ref_all: bool = True,
+    path: str = "data/",
+    executor: Executor = None,
 ) -> pd.DataFrame:
     """
-    Elaborates dataset from soups and links.
+    Elaborates dataset from article records and links.
 
     Parameters:
     law_source (str): The source of the law data.
-    soups (list): List of BeautifulSoup objects.
-    links (list): List of links corresponding to the soups.
+    records (iterable): Article records built by sc.page_to_record.
+    links (list): List of links corresponding to the records.
     save_dataset (bool): Whether to save the dataset.
     ref_all (bool): Whether to include all references or not.
     path (str): Path to save the dataset.
+    executor (Executor): Worker pool to elaborate the articles with; without it,
+        or for small sources, articles are elaborated serially.
 
     Returns:
     pd.DataFrame: The elaborated dataset.
     """
-    data = []
+    # Fill one preallocated list per column instead of a list of row dicts
+    n = len(links)
+    names, hierarchies, texts, refs_list = [None] * n, [None] * n, [None] * n, [None] * n
 
-    for soup, link in zip(soups, links):
-        name_article = soup.find("h1", class_="hbox-header").text.strip()
-        hierarchy = link.split("/")[2:-1]
+    tasks = ((law_source, record, link, ref_all) for record, link in zip(records, links))
+    if executor is None or n < _PARALLEL_MIN_ARTICLES:
+        rows = map(process_article, tasks)
+    else:
+        rows = elaborate_in_batches(tasks, executor)
+
+    for i, row in enumerate(rows):
+        names[i], hierarchies[i], texts[i], refs_list[i] = row
+
+    df = pd.DataFrame(
+        {
+            "name": names,
+            "hierarchy": hierarchies,
+            "text": texts,
+            "references": refs_list,
+            "link": list(links),
+        },
+        copy=False,
+    )
+    print("Dataset created correctly")
 
-        body_text = soup.find("div", class_="corpoDelTesto")
-        article_text, references = "", []
+    if save_dataset:
+        save_json(df, os.path.join(path, f"{law_source}.json"))
 
-        if body_text:
-            article_text, references = extract_ref(law_source, body_text, ref_all)
+    return df
 
-        data.append(
-            {
-                "name": name_article,
-                "hierarchy": hierarchy,
-                "text": article_text,
-                "references": references,
-                "link": link,
-            }
-        )
 
-    df = pd.DataFrame(data)
-    print("Dataset created correctly")
+def elaborate_in_batches(tasks, executor: Executor):
+    """
+    Elaborates articles in worker processes, keeping records streamed.
 
-    if save_dataset:
-        df.to_json(os.path.join(path, f"{law_source}.json"), orient="records")
+    Tasks are consumed one batch at a time and at most _MAX_PENDING_BATCHES
+    batches are in flight, so the records are not all loaded at once.
 
-    return df
+    Parameters:
+    tasks (iterator): Arguments of process_article for each article.
+    executor (Executor): Worker pool to elaborate the articles with.
+
+    Yields:
+    tuple: The result of process_article for each article, in order.
+    """
+    pending = deque()
+    for batch in iter(lambda: list(islice(tasks, _BATCH_SIZE)), []):
+        pending.append(executor.submit(process_articles, batch))
+        if len(pending) >= _MAX_PENDING_BATCHES:
+            yield from pending.popleft().result()
+
+    while pending:
+        yield from pending.popleft().result()
+
+
+def process_articles(batch: list) -> list:
+    """
+    Elaborates a batch of articles in a worker process.
 
+    Parameters:
+    batch (list): Arguments of process_article for each article.
 
-def extract_ref(law_source: str, body_text, ref_all: bool = True) -> tuple:
+    Returns:
+    list: The result of process_article for each article.
+    """
+    return [process_article(args) for args in batch]
+
+
+def process_article(args: tuple) -> tuple:
+    """
+    Elaborates a single article.
+
+    Parameters:
+    args (tuple): The law source, the article record, its link and ref_all.
+
+    Returns:
+    tuple: Name, hierarchy, cleaned text and references of the article.
+    """
+    law_source, record, link, ref_all = args
+    article_text, references = "", []
+
+    if record["text"] is not None:
+        article_text, references = extract_ref(
+            law_source, record["text"], record["hrefs"], ref_all
+        )
+
+    return record["name"], link.split("/")[2:-1], article_text, references
+
+
+def extract_ref(law_source: str, body_text: str, hrefs: list, ref_all: bool = True) -> tuple:
     """
     Extracts references from the body text.
 
     Parameters:
     law_source (str): The source of the law data.
-    body_text (BeautifulSoup): The body text of the law.
+    body_text (str): The body text of the law.
+    hrefs (list): The links found in the body text.
     ref_all (bool): Whether to include all references or not.
 
     Returns:
     tuple: Cleaned paragraph text and references.
     """
-    paragraph_text = body_text.text.strip()
-
     # Remove [word, etc], (numbers, word, etc), \n and double space from text
-    paragraph_text = re.sub(r" \[[^\]]+\]|\([^\)]+\]|\([^\)]+\)", "", paragraph_text)
-    paragraph_text = re.sub(r"\[[^\)]+\]|\([^\)]+\)", "", paragraph_text)
-    paragraph_text = re.sub(r"\n|  ", " ", paragraph_text)
+    paragraph_text = _RE_BRACKETED.sub("", body_text)
+    paragraph_text = _RE_BRACKETED2.sub("", paragraph_text)
+    paragraph_text = _RE_WS.sub(" ", paragraph_text)
 
     if ref_all:
-        references = [
-            ref["href"]
-            for ref in body_text.find_all("a", href=True)
-            if not ref["href"].startswith("/dizionario")
-            and not ref["href"].startswith("#nota_")
-        ]
+        references = [href for href in hrefs if not href.startswith(_EXCLUDED_REFS)]
     else:
-        references = [
-            ref["href"]
-            for ref in body_text.find_all("a", href=True)
-            if ref["href"].startswith(f"/{law_source}/")
-        ]
+        references = [href for href in hrefs if href.startswith(f"/{law_source}/")]
 
     return paragraph_text, references
 
+def load_json(file: str) -> pd.DataFrame:
+    """
+    Loads a dataset stored as line-delimited JSON records.
+
+    Files holding a single JSON list of records, as written by previous
+    versions, are also accepted.
+
+    Parameters:
+    file (str): Path of the JSON file.
+
+    Returns:
+    pd.DataFrame: The loaded dataset.
+    """
+    with open(file, "rb") as f:
+        legacy = f.read(1) == b"["
+        f.seek(0)
+        if legacy:
+            rows = orjson.loads(f.read())
+        else:
+            rows = [orjson.loads(line) for line in f if line.strip()]
+    return pd.DataFrame(rows)
+
+
+def save_json(df: pd.DataFrame, file: str) -> None:
+    """
+    Saves a dataset as line-delimited JSON records, one row at a time.
+
+    Parameters:
+    df (pd.DataFrame): The dataset to save.
+    file (str): Path of the JSON file.
+    """
+    columns = df.columns.tolist()
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+    with open(file, "wb") as f:
+        for row in df.itertuples(index=False, name=None):
+            f.write(orjson.dumps(dict(zip(columns, row)), option=option))
+
+
 def filter_list(df, filter_list):
     """
     Filter the DataFrame based on a list of prefixes.
@@ -1,33 +1,82 @@
+import os
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse import csgraph
 import json
 import networkx as nx
 import matplotlib.pyplot as plt
 import dataset as ds
 
+# Numba is only needed to build dense adjacency matrices
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
-def load_matrix(df, path="data/matrix/", filename="adjacency_matrix.npy", filter_list=None):
+
+def matrix_file(path, filename, extension=".npz"):
     """
-    Load the adjacency matrix from a specified path and filename, and return it as a DataFrame.
+    Build the path of a matrix file, replacing the extension of the filename.
+
+    Args:
+    path (str): Path to the directory containing the matrix file.
+    filename (str): Name of the matrix file.
+    extension (str): Extension of the matrix file.
+
+    Returns:
+    str: Path of the matrix file.
+    """
+    return f"{path}{os.path.splitext(filename)[0]}{extension}"
+
+
+def load_matrix(df=None, path="data/matrix/", filename="adjacency_matrix.npz", filter_list=None):
+    """
+    Load the adjacency matrix from a specified path and filename, with the names of its nodes.
+
+    Both sparse .npz matrices and dense .npy matrices (saved with dense=True or
+    by previous versions) are read; if both exist, the most recently saved one
+    is used, and dense matrices are converted to sparse. Node names are read from the
+    _names.npy file saved next to the matrix; df and filter_list are only
+    needed for matrices saved without it.
     
     Args:
-    df (pd.DataFrame): DataFrame containing node names.
+    df (pd.DataFrame): DataFrame containing node names, for matrices without a _names.npy file.
     path (str): Path to the directory containing the adjacency matrix file.
     filename (str): Name of the file containing the adjacency matrix.
+    filter_list (list): List of prefixes the matrix was filtered by, for matrices without a _names.npy file.
 
     Returns:
-    pd.DataFrame: DataFrame representing the adjacency matrix.
+    tuple: Sparse adjacency matrix (scipy.sparse.csr_matrix) and array of node names.
+
+    Raises:
+    ValueError: If df is missing for a matrix saved without a _names.npy file.
     """
-    adjacency_matrix = np.load(f"{path}{filename}")
-    
-    # Filter the DataFrame based on the filter_list
-    if filter_list:
-        df = ds.filter_list(df, filter_list)
-        
-    return pd.DataFrame(adjacency_matrix, columns=df["name"], index=df["name"])
+    sparse_file, dense_file = matrix_file(path, filename), matrix_file(path, filename, ".npy")
+    if os.path.exists(sparse_file) and (
+        not os.path.exists(dense_file) or os.path.getmtime(sparse_file) >= os.path.getmtime(dense_file)
+    ):
+        adjacency_matrix = sp.load_npz(sparse_file)
+    else:
+        adjacency_matrix = sp.csr_matrix(np.load(dense_file), dtype=np.int8)
+
+    if os.path.exists(matrix_file(path, filename, "_names.npy")):
+        names = np.load(matrix_file(path, filename, "_names.npy"))
+    else:
+        if df is None:
+            raise ValueError(
+                f"df is required to name the nodes of {filename}, which was saved without a _names.npy file"
+            )
+        # Filter the DataFrame based on the filter_list
+        if filter_list:
+            df = ds.filter_list(df, filter_list)
+        names = df["name"].to_numpy(dtype=str)
+
+    return adjacency_matrix, names
 
 
-def matrix_creation(df, save=True, path="data/matrix/", filter_list=None, filename="adjacency_matrix.npy"):
+def matrix_creation(df, save=True, path="data/matrix/", filter_list=None, filename="adjacency_matrix.npz", dense=False):
     """
     Create an adjacency matrix from a DataFrame of references and optionally save it to a file.
     
@@ -36,81 +85,173 @@ def matrix_creation(df, save=True, path="data/matrix/", filter_list=None, filena
     save (bool): Whether to save the adjacency matrix to a file.
     path (str): Path to the directory where the matrix will be saved.
     filter_list (list): List of prefixes to filter references by.
-    filename (str): Name of the file to save the adjacency matrix.
+    filename (str): Name of the file to save the adjacency matrix, stored as sparse .npz
+        (or .npy if dense) next to the _names.npy and _links.npy files of its rows.
+    dense (bool): Whether to build a dense matrix instead of a sparse one.
 
     Returns:
-    pd.DataFrame: DataFrame representing the adjacency matrix.
+    tuple: Adjacency matrix (scipy.sparse.csr_matrix, or np.ndarray if dense) and array of node names.
     """
     # Filter the DataFrame based on the filter_list
     if filter_list:
         df = ds.filter_list(df, filter_list)
 
-    # Initialize the adjacency matrix with zeros
-    adjacency_matrix = np.zeros((len(df), len(df)))
+    # Map each link to the first row holding it
+    first = ~df["link"].duplicated().to_numpy()
+    link_to_idx = pd.Series(np.flatnonzero(first), index=df["link"].to_numpy()[first])
 
-    # Populate the adjacency matrix based on the references
-    for i in range(len(df)):
-        for ref in df["references"][i]:
-            # If the reference does not exist in df, skip it
-            if ref not in df["link"].values:
-                continue
-            else:
-                adjacency_matrix[i, df[df["link"] == ref].index[0]] = 1
+    # Resolve the references found in df to (row, column) pairs
+    refs = df["references"].reset_index(drop=True).explode()
+    cols = refs.map(link_to_idx).dropna().astype(np.int32)
+    rows = cols.index.to_numpy(np.int32)
 
-    # Save the adjacency matrix if required
+    if dense:
+        if njit is None:
+            raise ImportError("numba is required to build dense adjacency matrices")
+        # Rows are sorted, so the references of row i are cols[ref_offsets[i]:ref_offsets[i + 1]]
+        ref_offsets = np.searchsorted(rows, np.arange(len(df) + 1))
+        adjacency_matrix = fill_adjacency(ref_offsets, cols.to_numpy(), len(df))
+    else:
+        adjacency_matrix = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int8), (rows, cols.to_numpy())), shape=(len(df), len(df))
+        )
+        # Repeated references are summed on construction, keep them binary
+        adjacency_matrix.data[:] = 1
+
+    names = df["name"].to_numpy(dtype=str)
+
+    # Save the adjacency matrix if required, with the names and links of its rows
     if save:
-        np.save(f"{path}{filename}", adjacency_matrix)
+        if dense:
+            np.save(matrix_file(path, filename, ".npy"), adjacency_matrix)
+        else:
+            sp.save_npz(matrix_file(path, filename), adjacency_matrix)
+        np.save(matrix_file(path, filename, "_names.npy"), names)
+        np.save(matrix_file(path, filename, "_links.npy"), df["link"].to_numpy(dtype=str))
+
+    return adjacency_matrix, names
 
-    return pd.DataFrame(adjacency_matrix, columns=df["name"], index=df["name"])
 
-def graph_creation(adjacency_matrix):
+def fill_adjacency(ref_offsets, ref_targets, n):
+    """
+    Fill a dense adjacency matrix from the resolved references of each row.
+
+    Args:
+    ref_offsets (np.ndarray): Array of n + 1 offsets of the references of each row into ref_targets.
+    ref_targets (np.ndarray): Column indices of the resolved references.
+    n (int): Number of rows.
+
+    Returns:
+    np.ndarray: Dense int8 adjacency matrix.
+    """
+    adjacency_matrix = np.zeros((n, n), dtype=np.int8)
+    for i in prange(n):
+        for k in range(ref_offsets[i], ref_offsets[i + 1]):
+            adjacency_matrix[i, ref_targets[k]] = 1
+    return adjacency_matrix
+
+
+if njit is not None:
+    fill_adjacency = njit(cache=True, parallel=True)(fill_adjacency)
+
+
+def graph_creation(adjacency_matrix, directed=False):
     """
     Create a graph from an adjacency matrix.
     
     Args:
-    adjacency_matrix (pd.DataFrame): DataFrame representing the adjacency matrix.
+    adjacency_matrix (scipy.sparse.csr_matrix or np.ndarray): The adjacency matrix.
+    directed (bool): Whether to create a directed graph, with an edge from each article to the ones it references.
 
     Returns:
-    networkx.Graph: Graph created from the adjacency matrix.
+    networkx.Graph: Graph created from the adjacency matrix, with integer nodes.
     """
-    return nx.from_numpy_array(adjacency_matrix.values)
+    create_using = nx.DiGraph if directed else None
+    if sp.issparse(adjacency_matrix):
+        return nx.from_scipy_sparse_array(adjacency_matrix, create_using=create_using)
+    return nx.from_numpy_array(adjacency_matrix, create_using=create_using)
 
 
-def centrality(G, df):
+def component_eigenvector_centrality(G):
+    """
+    Calculate eigenvector centrality with scipy's sparse eigensolver, one connected component at a time.
+
+    nx.eigenvector_centrality_numpy is only reliable on connected graphs. Here the leading
+    eigenpair of each component is computed separately; the components with the largest
+    eigenvalue make up the leading eigenvector of the whole graph, as power iteration
+    converges to, and the other nodes get zero. The result is normalised to unit length.
+    
+    Args:
+    G (networkx.Graph): Graph for which eigenvector centrality is to be calculated.
+
+    Returns:
+    dict: Eigenvector centrality of each node.
+    """
+    nodes = list(G)
+    if not nodes:
+        return {}
+
+    adjacency_matrix = nx.to_scipy_sparse_array(G, nodelist=nodes, dtype=float, format="csr")
+    if G.is_directed():
+        # Centrality of directed graphs comes from the in-edges, as in networkx
+        adjacency_matrix = adjacency_matrix.T.tocsr()
+
+    n_components, labels = csgraph.connected_components(adjacency_matrix, directed=G.is_directed(), connection="weak")
+    eigenvalues = np.zeros(n_components)
+    eigenvectors = []
+
+    for c in range(n_components):
+        idx = np.flatnonzero(labels == c)
+        component = adjacency_matrix[idx][:, idx]
+
+        # ARPACK needs at least 3 nodes, smaller components are solved densely
+        if len(idx) < 3:
+            values, vectors = np.linalg.eig(component.toarray())
+        else:
+            values, vectors = spla.eigs(component, k=1, which="LR")
+
+        k = np.argmax(values.real)
+        eigenvalues[c] = values[k].real
+        # The leading eigenvector has a single sign, abs also clears round-off noise
+        eigenvectors.append(np.abs(vectors[:, k].real))
+
+    centrality = np.zeros(len(nodes))
+    for c in np.flatnonzero(np.isclose(eigenvalues, eigenvalues.max())):
+        centrality[labels == c] = eigenvectors[c] / np.linalg.norm(eigenvectors[c])
+
+    centrality /= np.linalg.norm(centrality)
+    return dict(zip(nodes, centrality))
+
+
+def centrality(G, names):
     """
     Calculate centrality measures for a graph.
     
     Args:
     G (networkx.Graph): Graph for which centrality measures are to be calculated.
-    df (pd.DataFrame): DataFrame containing node names.
+    names (np.ndarray): Names of the nodes, in node order.
 
     Returns:
     pd.DataFrame: DataFrame containing degree centrality, eigenvector centrality, and PageRank for each node.
     """
     # Calculate degree centrality
     degree_centrality = nx.degree_centrality(G)
-    degree_centrality = pd.DataFrame.from_dict(
-        degree_centrality, orient="index", columns=["degree_centrality"]
-    )
-    
-    # Calculate eigenvector centrality
-    eigenvector_centrality = nx.eigenvector_centrality(G)
-    eigenvector_centrality = pd.DataFrame.from_dict(
-        eigenvector_centrality, orient="index", columns=["eigenvector_centrality"]
-    )
 
-    # Calculate PageRank
+    # Calculate eigenvector centrality with scipy's sparse eigensolver, per component
+    eigenvector_centrality = component_eigenvector_centrality(G)
+
+    # Calculate PageRank, solved by networkx on a scipy sparse matrix
     pagerank = nx.pagerank(G)
-    pagerank = pd.DataFrame.from_dict(pagerank, orient="index", columns=["pagerank"])
 
     # Merge centrality measures into a single DataFrame
-    centrality_measures = degree_centrality.merge(
-        eigenvector_centrality, left_index=True, right_index=True
-    )
-    centrality_measures = centrality_measures.merge(
-        pagerank, left_index=True, right_index=True
+    centrality_measures = pd.DataFrame(
+        {
+            "degree_centrality": degree_centrality,
+            "eigenvector_centrality": eigenvector_centrality,
+            "pagerank": pagerank,
+        }
     )
-    centrality_measures.index = df["name"]
+    centrality_measures.index = pd.Index(names, name="name")
 
     return centrality_measures
 
@@ -120,13 +261,13 @@ if __name__ == "__main__":
     df = ds.dataset_loop(loop=False, sources_load=False)
     
     # Create the adjacency matrix
-    adjacency_matrix = matrix_creation(df, save=True)
+    adjacency_matrix, names = matrix_creation(df, save=True)
     
     # Create the graph
     G = graph_creation(adjacency_matrix)
     
     # Calculate centrality measures
-    centrality_measures = centrality(G, df)
+    centrality_measures = centrality(G, names)
     
     # Optionally, you can save or visualize the centrality measures
     # Example: Save to a CSV file
@@ -14,14 +14,14 @@ def main(filename, load_matrix=True, load_data=True, filter_list=None, centralit
     else:
         df = ds.dataset_loop(loop=True) 
     if load_matrix:
-        adjacency_matrix = gr.load_matrix(df, filter_list=filter_list, filename=filename)
+        adjacency_matrix, names = gr.load_matrix(df, filter_list=filter_list, filename=filename)
     else:           
-        adjacency_matrix = gr.matrix_creation(df, filter_list=filter_list, filename=filename)
+        adjacency_matrix, names = gr.matrix_creation(df, filter_list=filter_list, filename=filename)
     
     G = gr.graph_creation(adjacency_matrix)
     
     if centrality:
-        centrality_measures = gr.centrality(G, df)
+        centrality_measures = gr.centrality(G, names)
         return G, centrality_measures
     else:
         return G
@@ -1,10 +1,20 @@
-import time
-import pickle
-from bs4 import BeautifulSoup
-from urllib.request import urlopen
-
-
-def brocardi_scraper(law_source, save_scraping=True, path="data/soups/"):
+import mmap
+import struct
+import asyncio
+import aiohttp
+import blosc
+import orjson
+import requests
+from concurrent.futures import ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+from selectolax.parser import HTMLParser
+
+# Shared session for the synchronous requests, reusing pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+
+def brocardi_scraper(law_source, save_scraping=True, path="data/soups/", concurrency=8):
     """
     Scrapes the specified law source from the Brocardi website.
 
@@ -12,21 +22,24 @@ def brocardi_scraper(law_source, save_scraping=True, path="data/soups/"):
     law_source (str): The law source to scrape.
     save_scraping (bool): Whether to save the scraped data.
     path (str): The path to save the scraped data.
+    concurrency (int): Maximum number of simultaneous requests.
 
     Returns:
-    soups (list): List of BeautifulSoup objects for the articles.
-    articles (list): List of article URLs.
+    records (list): List of article records, see page_to_record.
+    articles (list): List of scraped article URLs.
     """
     print(f"Scraping {law_source} started")
     url_root = "https://www.brocardi.it/"
 
     books = scrape_books(url_root, law_source)
-    articles = scrape_articles(url_root, law_source, books)
-    soups, missing = scrape_article_contents(url_root, articles)
+    articles = asyncio.run(scrape_articles(url_root, law_source, books, concurrency))
+    records, articles, missing = asyncio.run(
+        scrape_article_contents(url_root, articles, concurrency)
+    )
 
     if save_scraping:
-        store_scraped_data(soups, missing, articles, law_source, path)
-    return soups, articles
+        store_scraped_data(records, missing, articles, law_source, path)
+    return records, articles
 
 
 def scrape_books(url_root, law_source):
@@ -40,43 +53,105 @@ def scrape_books(url_root, law_source):
     Returns:
     books (list): List of book URLs.
     """
-    html = urlopen(url_root + law_source + "/").read()
-    soup = BeautifulSoup(html, "html.parser")
-    content = soup.find(
-        "div", {"class": "section_content content-box content-ext-guide"}
-    )
-    books = [link.get("href") for link in content.find_all("a") if link.get("href")]
+    html = get_page(url_root + law_source + "/")
+    soup = HTMLParser(html)
+    content = soup.css_first('div[class="section_content content-box content-ext-guide"]')
+    books = [
+        link.attributes.get("href")
+        for link in content.css("a")
+        if link.attributes.get("href")
+    ]
     print("Book links scraped")
     return books
 
 
-def scrape_articles(url_root, law_source, books):
+def get_page(url):
+    """
+    Downloads a page with the shared HTTP session.
+
+    Parameters:
+    url (str): The URL to download.
+
+    Returns:
+    bytes: The raw page.
+    """
+    response = _SESSION.get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+async def fetch(session, semaphore, url):
+    """
+    Downloads a page, holding the semaphore for the duration of the request.
+
+    Parameters:
+    session (aiohttp.ClientSession): The HTTP session to use.
+    semaphore (asyncio.Semaphore): Semaphore bounding the concurrent requests.
+    url (str): The URL to download.
+
+    Returns:
+    bytes: The raw page.
+    """
+    async with semaphore:
+        async with session.get(url) as response:
+            return await response.read()
+
+
+async def scrape_articles(url_root, law_source, books, concurrency=8):
     """
     Scrapes the article links from the books.
 
+    Book pages are downloaded concurrently and parsed in worker processes as
+    they arrive.
+
     Parameters:
     url_root (str): The root URL of the Brocardi website.
     law_source (str): The law source to scrape.
     books (list): List of book URLs.
+    concurrency (int): Maximum number of simultaneous requests.
 
     Returns:
     articles (list): List of article URLs.
     """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape_book(session, executor, book):
+        html = await fetch(session, semaphore, url_root + book)
+        return await loop.run_in_executor(executor, extract_article_links, html)
+
+    async with aiohttp.ClientSession(raise_for_status=True) as session:
+        with ProcessPoolExecutor() as executor:
+            books_links = await asyncio.gather(
+                *[scrape_book(session, executor, book) for book in books]
+            )
+
     articles = []
-    for book in books:
-        time.sleep(0.5)
-        html = urlopen(url_root + book).read()
-        soup = BeautifulSoup(html, "html.parser")
-        links = [
-            link.get("href")
-            for link in soup.find_all("a")
-            if link.get("href") and link.get("href").endswith("html")
-        ]
+    for links in books_links:
         articles.extend(filter_articles(law_source, links))
     print("Article links scraped")
     return articles
 
 
+def extract_article_links(html):
+    """
+    Extracts the links to HTML pages from a book page.
+
+    Parameters:
+    html (bytes): The raw book page.
+
+    Returns:
+    links (list): List of HTML page URLs.
+    """
+    soup = HTMLParser(html)
+    links = [
+        link.attributes.get("href")
+        for link in soup.css("a")
+        if link.attributes.get("href") and link.attributes.get("href").endswith("html")
+    ]
+    return links
+
+
 def filter_articles(law_source, articles):
     """
     Filters the article links to include only those that belong to the specified law source.
@@ -92,45 +167,114 @@ def filter_articles(law_source, articles):
     return filtered_articles
 
 
-def scrape_article_contents(url_root, articles):
+async def scrape_article_contents(url_root, articles, concurrency=8):
     """
     Scrapes the contents of the articles.
 
+    Pages are downloaded concurrently and reduced to records in worker
+    processes as they arrive, so raw pages are not kept in memory.
+
     Parameters:
     url_root (str): The root URL of the Brocardi website.
     articles (list): List of article URLs.
+    concurrency (int): Maximum number of simultaneous requests.
 
     Returns:
-    soups (list): List of BeautifulSoup objects for the articles.
-    missing (list): List of missing article URLs.
+    records (list): List of article records, see page_to_record.
+    found (list): List of article URLs matching the records.
+    missing (list): List of article URLs that could not be downloaded.
     """
-    soups = []
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape_article(session, executor, article):
+        html = await fetch(session, semaphore, url_root + article)
+        return await loop.run_in_executor(executor, page_to_record, html)
+
+    async with aiohttp.ClientSession(raise_for_status=True) as session:
+        with ProcessPoolExecutor() as executor:
+            results = await asyncio.gather(
+                *[scrape_article(session, executor, article) for article in articles],
+                return_exceptions=True,
+            )
+
+    records = []
+    found = []
     missing = []
-    for article in articles:
-        try:
-            html = urlopen(url_root + article).read()
-            soups.append(BeautifulSoup(html, "html.parser"))
-        except:
-            print(f"Article {article} not found")
+    for article, result in zip(articles, results):
+        if isinstance(result, (aiohttp.ClientError, asyncio.TimeoutError)):
+            # HTTP and connection errors: the article could not be downloaded
+            print(f"Article {article} not found: {type(result).__name__}: {result}")
             missing.append(article)
-        time.sleep(0.5)
+        elif isinstance(result, Exception):
+            # Anything else is a parsing or worker failure, not a missing page
+            print(f"Article {article} not scraped: {type(result).__name__}: {result}")
+        else:
+            records.append(result)
+            found.append(article)
     print("Article contents scraped")
-    return soups, missing
+    return records, found, missing
 
 
-def store_scraped_data(soups, missing, articles, law_source, path):
+def page_to_record(html):
     """
-    Stores the scraped data.
+    Reduces an article page to the parts used to build the dataset.
 
     Parameters:
-    soups (list): List of BeautifulSoup objects for the articles.
+    html (bytes): The raw article page.
+
+    Returns:
+    record (dict): The article name, the text of its body (None if the
+        article has no body) and the links found in the body.
+    """
+    soup = HTMLParser(html)
+
+    # Text and links both come from the body node, located once
+    body_text = soup.css_first("div.corpoDelTesto")
+    text, hrefs = None, []
+
+    if body_text is not None:
+        text = body_text.text().strip()
+        hrefs = [ref.attributes.get("href") or "" for ref in body_text.css("a[href]")]
+
+    record = {
+        "name": soup.css_first("h1.hbox-header").text().strip(),
+        "text": text,
+        "hrefs": hrefs,
+    }
+    return record
+
+
+def store_scraped_data(records, missing, articles, law_source, path):
+    """
+    Stores the scraped data as Blosc-compressed JSON records.
+
+    The file starts with the length of a JSON header listing, for each article,
+    its URL and the offset and size of its compressed record in the data section.
+
+    Parameters:
+    records (list): List of article records.
     missing (list): List of missing article URLs.
     articles (list): List of article URLs.
     law_source (str): The law source to scrape.
     path (str): The path to save the scraped data.
     """
-    with open(f"{path}{law_source}.pkl", "wb") as f:
-        pickle.dump(list(zip(soups, articles)), f)
+    chunks = [
+        blosc.compress(orjson.dumps(record), typesize=1, cname="zstd", clevel=3)
+        for record in records
+    ]
+
+    index, offset = [], 0
+    for article, chunk in zip(articles, chunks):
+        index.append([article, offset, len(chunk)])
+        offset += len(chunk)
+    header = orjson.dumps(index)
+
+    with open(f"{path}{law_source}.blosc", "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for chunk in chunks:
+            f.write(chunk)
     print(f"{law_source} data stored")
 
     if missing:
@@ -138,6 +282,48 @@ def store_scraped_data(soups, missing, articles, law_source, path):
             m.write("\n".join(missing))
 
 
+def load_scraped_data(law_source, path="data/soups/"):
+    """
+    Loads the scraped data stored by store_scraped_data.
+
+    Only the header is read eagerly; records are decompressed one at a time as
+    they are consumed.
+
+    Parameters:
+    law_source (str): The law source to load.
+    path (str): The path of the scraped data.
+
+    Returns:
+    records (iterator): Article records, decompressed lazily.
+    articles (list): List of article URLs.
+    """
+    file = f"{path}{law_source}.blosc"
+    with open(file, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        index = orjson.loads(f.read(header_size))
+
+    articles = [article for article, _, _ in index]
+    records = iter_records(file, index, 8 + header_size)
+    return records, articles
+
+
+def iter_records(file, index, start):
+    """
+    Yields the article records of a scraped data file.
+
+    Parameters:
+    file (str): The scraped data file.
+    index (list): List of [article, offset, size] entries of the header.
+    start (int): Position of the data section in the file.
+
+    Yields:
+    dict: Record of each article.
+    """
+    with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for _, offset, size in index:
+            yield orjson.loads(blosc.decompress(mm[start + offset : start + offset + size]))
+
+
 def source_scraper(url="https://www.brocardi.it/fonti.html", save=True, path="data/"):
     """
     Scrapes the source links from the Brocardi website.
@@ -150,13 +336,13 @@ def source_scraper(url="https://www.brocardi.it/fonti.html", save=True, path="da
     Returns:
     sources (list): List of source URLs.
     """
-    html = urlopen(url).read()
-    soup = BeautifulSoup(html, "html.parser")
-    content = soup.find("div", {"class": "content-box content-ext-guide"})
+    html = get_page(url)
+    soup = HTMLParser(html)
+    content = soup.css_first('div[class="content-box content-ext-guide"]')
     sources = [
-        link.get("href")[1:-1]
-        for link in content.find_all("a")
-        if link.get("href") and link.get("href").startswith("/")
+        link.attributes.get("href")[1:-1]
+        for link in content.css("a")
+        if link.attributes.get("href") and link.attributes.get("href").startswith("/")
     ]
 
     if save: